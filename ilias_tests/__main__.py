@@ -5,6 +5,7 @@ import sys
 from dataclasses import asdict
 from pathlib import Path, PurePath
 import json
+import re
 from typing import Any
 
 from PFERD.auth import KeyringAuthenticator, KeyringAuthSection, SimpleAuthenticator, SimpleAuthSection
@@ -21,7 +22,10 @@ from .automation import (
     slurp_participant_results,
 )
 from .ilias_action import IliasInteractor
-from .spec import load_spec_from_file, dump_tests_to_yml, filter_with_regex, TestTab
+from .spec import load_spec_from_file, dump_tests_to_yml, filter_with_regex_compiled, TestTab
+
+_INDENT4 = "    "
+_INDENT8 = "        "
 
 
 def load_interactor(args: argparse.Namespace):
@@ -64,9 +68,14 @@ async def run_slurp(interactor: IliasInteractor, args: argparse.Namespace):
     tests = await slurp_tests_from_folder(interactor, url, data_path)
 
     spec_path = data_path / "spec.yml"
+
+    def write_spec():
+        with open(spec_path, "w", encoding="utf-8") as file:
+            dump_tests_to_yml(tests, file)
+
     log.status("[cyan]", "Slurp", f"Writing spec to {fmt_path(spec_path)}")
-    with open(spec_path, "w") as file:
-        file.write(dump_tests_to_yml(tests))
+    # Dumping and writing large specs can take a while, keep the event loop (and the open session) responsive
+    await asyncio.to_thread(write_spec)
 
 
 async def run_create(interactor: IliasInteractor, args: argparse.Namespace):
@@ -83,7 +92,8 @@ async def run_create(interactor: IliasInteractor, args: argparse.Namespace):
     spec = load_spec_from_file(spec_path)
 
     log.explain_topic(f"Filtering tests with {test_filter_regex!r}")
-    tests = [test for test in spec.tests if filter_with_regex(test.title, test_filter_regex)]
+    test_filter = re.compile(test_filter_regex)
+    tests = [test for test in spec.tests if filter_with_regex_compiled(test.title, test_filter)]
     log.status("[bold cyan]", "Create", f"Selected {len(tests)} test(s) after filtering")
 
     target_folders = await ilias_glob_regex(
@@ -93,9 +103,9 @@ async def run_create(interactor: IliasInteractor, args: argparse.Namespace):
 
     for path, page in target_folders:
         log.status("[cyan]", "Create", f"Creating tests in {fmt_path(path)}")
-        for index, test in list(enumerate(tests)):
+        for index, test in enumerate(tests):
             log.status("[bold cyan]", "Create", f"  Adding test {index + 1}", f"[bright_black]({test.title})")
-            await add_test(interactor, page, test, indent=" " * 4)
+            await add_test(interactor, page, test, indent=_INDENT4)
 
 
 async def run_passes(interactor: IliasInteractor, args: argparse.Namespace):
@@ -121,7 +131,7 @@ async def run_passes(interactor: IliasInteractor, args: argparse.Namespace):
         if not test_page.is_test_page():
             log.warn("        Selected element is no test. Maybe your selector is incorrect?")
             continue
-        await interactor.end_all_user_passes(test_page, indent=" " * 8)
+        await interactor.end_all_user_passes(test_page, indent=_INDENT8)
     log.status("[bold cyan]", "Passes", "Done")
 
 
@@ -153,7 +163,7 @@ async def run_configure(interactor: IliasInteractor, args: argparse.Namespace):
         if args.publish or args.unpublish:
             log.status("[cyan]", "Configure", f"    {'Unpublishing' if args.unpublish else 'Publishing'} Test")
             test = tab.get_test_reconstruct_from_properties([])
-            await interactor.configure_test(
+            tab = await interactor.configure_test(
                 settings_page=tab,
                 title=test.title,
                 description=test.description,
@@ -361,9 +371,15 @@ def main():
         async with load_interactor(args) as interactor:
             await run_command(interactor, args)
 
+    # uvloop is an optional dependency, fall back to the default loop if it is not installed
+    try:
+        from uvloop import run as run_event_loop
+    except ImportError:
+        run_event_loop = asyncio.run
+
     # noinspection PyBroadException
     try:
-        asyncio.run(run())
+        run_event_loop(run())
     except KeyboardInterrupt:
         log.explain_topic("Interrupted, exiting immediately")
     except CrawlError as e:
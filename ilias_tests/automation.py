@@ -1,8 +1,13 @@
+import asyncio
+import contextlib
+import itertools
+import re
 from pathlib import Path, PurePath
-from typing import Awaitable, Callable, Optional, Any
+from typing import Awaitable, Callable, Any
 from dataclasses import asdict
 
-from PFERD.crawl.ilias.kit_ilias_html import IliasElementType
+from PFERD.crawl import CrawlError
+from PFERD.crawl.ilias.kit_ilias_html import IliasElementType, IliasPageElement
 from PFERD.logging import log
 from PFERD.utils import fmt_path
 from slugify import slugify
@@ -12,9 +17,10 @@ from .ilias_html import ExtendedIliasPage
 from .spec import (
     IliasTest,
     TestQuestion,
-    filter_with_regex,
+    filter_with_regex_compiled,
     TestTab,
     manual_grading_write_question_md,
+    ManualGradingParticipantInfo,
     ManualGradingParticipantResults,
     load_manual_grading_results_from_md,
 )
@@ -35,88 +41,104 @@ async def add_test(interactor: IliasInteractor, folder: ExtendedIliasPage, test:
         test.ending_time,
         test.number_of_tries,
     )
-    # Somehow ILIAS needs this twice to actually fill out the intro text...
-    tab_page = await interactor.configure_test(
-        tab_page,
-        test.title,
-        test.description,
-        test.intro_text,
-        test.starting_time,
-        test.ending_time,
-        test.number_of_tries,
-    )
     log.status("[cyan]", "Create", f"{indent}Configure scoring settings so people see their results")
     tab_page = await interactor.configure_test_scoring(tab_page)
     log.explain_topic("Navigating to questions")
     tab_page = await interactor.select_tab(tab_page, TestTab.QUESTIONS)
 
     log.explain_topic("Adding questions")
+    last_page = tab_page
     for index, question in enumerate(test.questions):
         log.status(
             "[bold cyan]", "Create", f"{indent}Adding question {index + 1}", f"[bright_black]({question.title!r})"
         )
-        await interactor.add_question(tab_page, question)
+        last_page = await interactor.add_question(tab_page, question)
 
-    log.explain("Navigating to questions")
-    tab_page = await interactor.select_tab(tab_page, TestTab.QUESTIONS)
+    # The question listing must be fresh for reordering, so only navigate if we drifted away from it
+    if last_page.is_test_question_listing_page():
+        tab_page = last_page
+    else:
+        log.explain("Navigating to questions")
+        tab_page = await interactor.select_tab(tab_page, TestTab.QUESTIONS)
 
     log.status("[cyan]", "Create", f"{indent}Reordering questions")
     await interactor.reorder_questions(tab_page, [q.title for q in test.questions])
 
 
-async def slurp_tests_from_folder(interactor: IliasInteractor, folder_url: str, aux_path: Path) -> list[IliasTest]:
+async def slurp_tests_from_folder(
+    interactor: IliasInteractor, folder_url: str, aux_path: Path, concurrency: int = 4
+) -> list[IliasTest]:
     log.status("[cyan]", "Slurp", "Crawling folder")
     page = await interactor.select_page(folder_url)
 
-    tests = []
+    test_children = []
     for child in page.get_child_elements():
         if child.type == IliasElementType.TEST:
             log.explain(f"Child {child.name!r} is a test, slurping")
-            log.status("[bold cyan]", "Slurp", f"Test: {child.name!r}")
-            test_page = await interactor.select_page(child.url)
-            properties_page = await interactor.select_tab(test_page, TestTab.SETTINGS)
-
-            questions = await slurp_questions_from_test(interactor, test_page, aux_path)
-
-            log.explain_topic("Converting settings page to test")
-            tests.append(properties_page.get_test_reconstruct_from_properties(questions))
+            test_children.append(child)
         else:
             log.explain(f"Skipping child ({child.name!r}) of wrong type {child.type!r}")
 
-    return tests
+    # Tests are independent, so slurp a few of them at once. gather keeps them in folder order.
+    semaphore = asyncio.Semaphore(concurrency)
+    return list(await asyncio.gather(*[_slurp_test(interactor, child, aux_path, semaphore) for child in test_children]))
+
+
+async def _slurp_test(
+    interactor: IliasInteractor, child: IliasPageElement, aux_path: Path, semaphore: asyncio.Semaphore
+) -> IliasTest:
+    async with semaphore:
+        log.status("[bold cyan]", "Slurp", f"Test: {child.name!r}")
+        test_page = await interactor.select_page(child.url)
+        properties_page = await interactor.select_tab(test_page, TestTab.SETTINGS)
+
+        questions = await slurp_questions_from_test(interactor, test_page, aux_path)
+
+        log.explain_topic("Converting settings page to test")
+        return properties_page.get_test_reconstruct_from_properties(questions)
 
 
 async def slurp_questions_from_test(
-    interactor: IliasInteractor, test_page: ExtendedIliasPage, data_path: Path
+    interactor: IliasInteractor, test_page: ExtendedIliasPage, data_path: Path, concurrency: int = 8
 ) -> list[TestQuestion]:
     question_tab = await interactor.select_tab(test_page, TestTab.QUESTIONS)
 
     elements = question_tab.get_test_question_listing()
-    questions: list[TestQuestion] = []
-    for title, url in elements:
+    # Questions are independent, so slurp them concurrently. gather keeps them in listing order.
+    semaphore = asyncio.Semaphore(concurrency)
+    return list(
+        await asyncio.gather(
+            *[_slurp_question(interactor, title, url, data_path, semaphore) for title, url in elements]
+        )
+    )
+
+
+async def _slurp_question(
+    interactor: IliasInteractor, title: str, url: str, data_path: Path, semaphore: asyncio.Semaphore
+) -> TestQuestion:
+    async with semaphore:
         log.status("[cyan]", "Slurp", "Question ", f"[bright_black]{title!r}")
         question_page = await interactor.select_page(url)
+        # Every question gets its own downloader, so file numbering stays independent between questions
         page_design = await question_page.get_test_question_design_blocks(
             downloader=_download_files(interactor, title, data_path)
         )
         edit_page = await interactor.select_page(question_page.get_test_question_edit_url())
-        questions.append(edit_page.get_test_question_reconstruct_from_edit(page_design))
-
-    return questions
+        return edit_page.get_test_question_reconstruct_from_edit(page_design)
 
 
 def _download_files(interactor: IliasInteractor, title: str, aux_path: Path) -> Callable[[str], Awaitable[Path]]:
-    counter = 0
+    counter = itertools.count()
+    title_slug = slugify(title)
 
     async def inner(url: str) -> Path:
-        nonlocal counter
+        index = next(counter)
         log.explain_topic(f"Downloading file from {url} to folder {fmt_path(aux_path)}")
-        log.explain(f"Current counter: {counter}")
+        log.explain(f"Current counter: {index}")
 
-        path = await interactor.download_file(url, aux_path, slugify(f"{title}-{counter}") + "-")
+        path = await interactor.download_file(url, aux_path, f"{title_slug}-{index}-")
 
         log.explain(f"Downloaded to {fmt_path(path)}")
-        counter += 1
         return path
 
     return inner
@@ -126,31 +148,38 @@ async def slurp_grading_state_to_md(
     interactor: IliasInteractor, test_page: ExtendedIliasPage, output_dir: Path
 ) -> None:
     participant_results = await slurp_participant_results(interactor, test_page)
-    questions = set([answer.question for res in participant_results for answer in res.answers])
-    for question in questions:
-        with open(output_dir / f"{question.id}.md", "w") as f:
-            f.write(manual_grading_write_question_md(participant_results, question))
+    # Keyed by id, as that also names the file
+    questions = {answer.question.id: answer.question for res in participant_results for answer in res.answers}
+    payloads = [
+        (output_dir / f"{question.id}.md", manual_grading_write_question_md(participant_results, question))
+        for question in questions.values()
+    ]
+    await asyncio.gather(*[asyncio.to_thread(path.write_bytes, md.encode()) for path, md in payloads])
 
 
 async def slurp_participant_results(
-    interactor: IliasInteractor, test_page: ExtendedIliasPage
+    interactor: IliasInteractor, test_page: ExtendedIliasPage, concurrency: int = 16
 ) -> list[ManualGradingParticipantResults]:
     log.explain_topic("Slurping test results")
-    log.explain("Navigating to manual grading tab")
-    tab_page = await interactor.select_tab(test_page, TestTab.MANUAL_GRADING)
-
-    log.explain("Navigating to manual grading per participant")
-    tab_page = await interactor.select_page(tab_page.get_manual_grading_per_participant_url())
+    participant_infos = await interactor.get_manual_grading_participant_infos(test_page)
 
-    log.explain("Showing all participants")
-    page = await interactor.set_manual_grading_filter_show_all(tab_page)
+    log.status("[bold cyan]", "Slurp", f"Slurping {len(participant_infos)} participants(s)")
 
-    participant_results = []
-    participant_infos = page.get_manual_grading_participant_infos()
+    semaphore = asyncio.Semaphore(concurrency)
+    return list(
+        await asyncio.gather(
+            *[
+                _slurp_participant(interactor, index, participant, semaphore)
+                for index, participant in enumerate(participant_infos)
+            ]
+        )
+    )
 
-    log.status("[bold cyan]", "Slurp", f"Slurping {len(participant_infos)} participants(s)")
 
-    for index, participant in enumerate(participant_infos):
+async def _slurp_participant(
+    interactor: IliasInteractor, index: int, participant: ManualGradingParticipantInfo, semaphore: asyncio.Semaphore
+) -> ManualGradingParticipantResults:
+    async with semaphore:
         log.status(
             "[cyan]",
             "Slurp",
@@ -159,13 +188,15 @@ async def slurp_participant_results(
         )
         participant_page = await interactor.select_page(participant.detail_link)
         participant_result = participant_page.get_manual_grading_participant_results(participant)
-        for answer in participant_result.answers:
-            question = answer.question
-            if question.question_type == "file_upload":
-                for file in answer.answer:
-                    await file.download(interactor)
-        participant_results.append(participant_result)
-    return participant_results
+        await asyncio.gather(
+            *[
+                file.download(interactor)
+                for answer in participant_result.answers
+                if answer.question.question_type == "file_upload"
+                for file in answer.answer
+            ]
+        )
+        return participant_result
 
 
 async def upload_grading_state(
@@ -174,52 +205,82 @@ async def upload_grading_state(
     input_dir: Path,
     mark_done: bool = False,
     notify_users: bool = False,
+    concurrency: int = 8,
 ) -> None:
     log.explain_topic("Uploading grading results")
 
     log.status("[bold cyan]", "Grading", f"Parsing saved data from {input_dir}")
-    results_by_mail = load_manual_grading_results_from_md(input_dir)
-
-    log.explain("Navigating to manual grading tab")
-    tab_page = await interactor.select_tab(test_page, TestTab.MANUAL_GRADING)
-
-    log.explain("Navigating to manual grading per participant")
-    tab_page = await interactor.select_page(tab_page.get_manual_grading_per_participant_url())
-
-    log.explain("Showing all participants")
-    page = await interactor.set_manual_grading_filter_show_all(tab_page)
-
-    participant_urls = page.get_manual_grading_participant_infos()
-    for index, participant in enumerate(participant_urls):
-        log.status(
-            "[cyan]",
-            "Grading",
-            f"  Updating participant {index + 1:-2}",
-            f"[link={participant.detail_link}][bright_black]{participant.format_name()!r}[/link]",
-        )
-        page = await interactor.select_page(participant.detail_link)
-        await interactor.upload_manual_grading_result(
-            page, results_by_mail[participant.email], mark_done=mark_done, notify_users=notify_users
-        )
+    # Parse in a worker thread while we navigate to the participants
+    parse_task = asyncio.create_task(asyncio.to_thread(load_manual_grading_results_from_md, input_dir))
+
+    try:
+        participant_infos = await interactor.get_manual_grading_participant_infos(test_page)
+    except BaseException:
+        # Do not leave the parse running, or its error unretrieved, when navigating failed
+        parse_task.cancel()
+        with contextlib.suppress(Exception, asyncio.CancelledError):
+            await parse_task
+        raise
+
+    results_by_mail = await parse_task
+
+    # Check everything up front, so we do not stop halfway through after some participants were already notified
+    missing = [
+        participant.format_name() for participant in participant_infos if participant.email not in results_by_mail
+    ]
+    if missing:
+        raise CrawlError(f"No saved grading results for participants: {', '.join(missing)}")
+
+    # Participants are independent. Notifying sends mails server-side though, so be gentler in that case.
+    semaphore = asyncio.Semaphore(2 if notify_users else concurrency)
+
+    async def upload_one(index: int, participant: ManualGradingParticipantInfo) -> None:
+        async with semaphore:
+            log.status(
+                "[cyan]",
+                "Grading",
+                f"  Updating participant {index + 1:-2}",
+                f"[link={participant.detail_link}][bright_black]{participant.format_name()!r}[/link]",
+            )
+            page = await interactor.select_page(participant.detail_link)
+            await interactor.upload_manual_grading_result(
+                page, results_by_mail[participant.email], mark_done=mark_done, notify_users=notify_users
+            )
+
+    # A task group cancels the remaining uploads as soon as one of them fails
+    try:
+        async with asyncio.TaskGroup() as group:
+            for index, participant in enumerate(participant_infos):
+                group.create_task(upload_one(index, participant))
+    except ExceptionGroup as e:
+        raise e.exceptions[0] from e
 
 
 async def ilias_glob_regex(
-    interactor: IliasInteractor, root: ExtendedIliasPage, regex: str
+    interactor: IliasInteractor, root: ExtendedIliasPage, regex: str, concurrency: int = 16
 ) -> list[tuple[PurePath, ExtendedIliasPage]]:
     """
     Returns all elements matching the given hierarchical regex pattern, starting at the given root.
     The pattern must be glob-like, i.e. 'top_level/second_level/third/...'. Each time a directory is entered, the next
     pattern is picked. For example: The pattern 'foo/bar' matches the file 'bar' in folder 'foo'.
     """
+    # A single trailing slash does not start a new segment
+    segments = tuple(re.compile(segment) for segment in regex.removesuffix("/").split("/")) if regex else ()
+
     urls_to_page = {}
-    for path, page in await _find_matching_elements(interactor, root, PurePath("."), regex):
+    semaphore = asyncio.Semaphore(concurrency)
+    for path, page in await _find_matching_elements(interactor, root, PurePath("."), segments, semaphore):
         urls_to_page[page.url()] = (path, page)
 
     return list(urls_to_page.values())
 
 
 async def _find_matching_elements(
-    interactor: IliasInteractor, root: ExtendedIliasPage, root_path: PurePath, regex: Optional[str]
+    interactor: IliasInteractor,
+    root: ExtendedIliasPage,
+    root_path: PurePath,
+    segments: tuple[re.Pattern[str], ...],
+    semaphore: asyncio.Semaphore,
 ) -> list[tuple[PurePath, ExtendedIliasPage]]:
     # foo/*/bar
     # .
@@ -228,37 +289,44 @@ async def _find_matching_elements(
     #      `- bar
     #    `- baz
     #      `- bar
-    # try current_regex (foo) against "foo" -> pass
-    #   try current_regex (*) against "hey" -> pass
-    #     try current_regex (bar) against "bar" -> pass
-    #       try None against "bar" -> return bar
+    # try segments[0] (foo) against "foo" -> pass
+    #   try segments[0] (*) against "hey" -> pass
+    #     try segments[0] (bar) against "bar" -> pass
+    #       no segments left for "bar" -> return bar
 
-    if not regex:
+    if not segments:
         return [(root_path, root)]
 
-    current_regex, next_glob = _strip_first_path_segment(regex)
-    matching = []
-
-    # Filter all before so the log output is nicer
-    for child in [child for child in root.get_child_elements() if _matches_regex_part(child.name, regex)]:
-        child_page = await interactor.select_page(child.url)
-        child_path = root_path / _sanitize_path_name(child.name)
-        matching.extend(await _find_matching_elements(interactor, child_page, child_path, next_glob))
+    # Siblings are independent, so descend into all of them at once. gather keeps the listing order.
+    matching = await asyncio.gather(
+        *[
+            _descend_into_child(interactor, child, root_path, segments[1:], semaphore)
+            for child in root.get_child_elements()
+            if filter_with_regex_compiled(child.name, segments[0])
+        ]
+    )
 
-    return matching
+    return list(itertools.chain.from_iterable(matching))
 
 
-def _matches_regex_part(to_test: str, glob_regex: str):
-    regex_start_segment, _ = _strip_first_path_segment(glob_regex)
-    return filter_with_regex(to_test, regex_start_segment)
+async def _descend_into_child(
+    interactor: IliasInteractor,
+    child: IliasPageElement,
+    root_path: PurePath,
+    segments: tuple[re.Pattern[str], ...],
+    semaphore: asyncio.Semaphore,
+) -> list[tuple[PurePath, ExtendedIliasPage]]:
+    # Only hold the semaphore for the request itself. Holding it while recursing could deadlock once all permits are
+    # taken by parents waiting for their children.
+    async with semaphore:
+        log.explain(f"Descending into {child.name!r}")
+        child_page = await interactor.select_page(child.url)
+    child_path = root_path / _sanitize_path_name(child.name)
+    return await _find_matching_elements(interactor, child_page, child_path, segments, semaphore)
 
 
-def _strip_first_path_segment(path_string: str) -> tuple[str, Optional[str]]:
-    if "/" in path_string:
-        slash_index = path_string.find("/")
-        return path_string[:slash_index], path_string[slash_index + 1 :]
-    return path_string, None
+_PATH_SEPARATOR_REPLACEMENTS = str.maketrans({"/": "-", "\\": "-"})
 
 
 def _sanitize_path_name(name: str) -> str:
-    return name.replace("/", "-").replace("\\", "-").strip()
+    return name.translate(_PATH_SEPARATOR_REPLACEMENTS).strip()
@@ -32,12 +32,18 @@ from .spec import (
     PageDesignBlockImage,
     PageDesignBlockCode,
     TestTab,
+    ManualGradingParticipantInfo,
     ManualGradingParticipantResults,
     manual_grading_feedback_md_to_html,
 )
 
 
 class IliasInteractor:
+    """
+    Performs actions on ILIAS. All requests share a single pooled session, so use the interactor as an async context
+    manager (`async with IliasInteractor(...) as interactor:`) for the whole run to close it (and save cookies).
+    """
+
     def __init__(
         self,
         authenticator: Authenticator,
@@ -50,13 +56,20 @@ class IliasInteractor:
         self._authentication_id = 0
         self._authentication_lock = asyncio.Lock()
         self._request_count = 0
+        self._manual_grading_participant_infos: dict[str, list[ManualGradingParticipantInfo]] = {}
 
         self._load_cookies()
 
         self.session = aiohttp.ClientSession(
             headers={"User-Agent": "Foobar"},
             cookie_jar=self._cookie_jar,
-            connector=aiohttp.TCPConnector(ssl=ssl.create_default_context(cafile=certifi.where())),
+            connector=aiohttp.TCPConnector(
+                ssl=ssl.create_default_context(cafile=certifi.where()),
+                # We only talk to ILIAS, but do so concurrently. Keep enough connections around to benefit from that,
+                # without hammering the server.
+                limit_per_host=16,
+                keepalive_timeout=75,
+            ),
             timeout=ClientTimeout(
                 # 30 minutes. No download in the history of downloads was longer than 30 minutes.
                 # This is enough to transfer a 600 MB file over a 3 Mib/s connection.
@@ -148,8 +161,8 @@ class IliasInteractor:
         ending_time: Optional[datetime.datetime],
         number_of_tries: int,
         online: bool = False,
-    ):
-        """Configures the base test properties."""
+    ) -> ExtendedIliasPage:
+        """Configures the base test properties. Returns the settings page after saving."""
         log.explain_topic(f"Configuring test {title}")
         base_params = {
             "cmd[saveForm]": "Speichern",
@@ -205,6 +218,22 @@ class IliasInteractor:
             **test_finish_params,
             **other_params,
         }
+
+        page = await self._save_test_settings(settings_page, data)
+        # Somehow ILIAS sometimes needs a second save to actually fill out the intro text...
+        # If we did not land on the settings form, we can not check that and always save twice like we used to.
+        saved_intro_text = page.get_test_intro_text()
+        if saved_intro_text is None:
+            log.explain("Could not find the intro text after saving, saving settings again")
+            page = await self._save_test_settings(page, data)
+        elif intro_text and not saved_intro_text:
+            log.explain("Intro text was not saved, saving settings again")
+            page = await self._save_test_settings(page, data)
+        return page
+
+    async def _save_test_settings(
+        self, settings_page: ExtendedIliasPage, data: dict[str, Union[str, list[str]]]
+    ) -> ExtendedIliasPage:
         url, extra_data = settings_page.get_test_settings_change_data()
 
         post_data = data.copy()
@@ -273,7 +302,7 @@ class IliasInteractor:
 
         return await self._post_authenticated(url=url, data=post_data)
 
-    async def add_question(self, question_page: ExtendedIliasPage, question: TestQuestion):
+    async def add_question(self, question_page: ExtendedIliasPage, question: TestQuestion) -> ExtendedIliasPage:
         log.explain_topic(f"Adding question {question.title!r}")
         url = question_page.get_test_add_question_url()
         page = await self._get_extended_page(url)
@@ -521,6 +550,27 @@ class IliasInteractor:
             soup_succeeded=lambda pg: "cmdclass=iltestparticipantsgui" in pg.normalized_url(),
         )
 
+    async def get_manual_grading_participant_infos(
+        self, test_page: ExtendedIliasPage
+    ) -> list[ManualGradingParticipantInfo]:
+        """Returns all participants of a test. Cached per test page, as fetching them takes three requests."""
+        if test_page.url() in self._manual_grading_participant_infos:
+            log.explain("Using cached manual grading participants")
+            return self._manual_grading_participant_infos[test_page.url()]
+
+        log.explain("Navigating to manual grading tab")
+        tab_page = await self.select_tab(test_page, TestTab.MANUAL_GRADING)
+
+        log.explain("Navigating to manual grading per participant")
+        tab_page = await self.select_page(tab_page.get_manual_grading_per_participant_url())
+
+        log.explain("Showing all participants")
+        page = await self.set_manual_grading_filter_show_all(tab_page)
+
+        participant_infos = page.get_manual_grading_participant_infos()
+        self._manual_grading_participant_infos[test_page.url()] = participant_infos
+        return participant_infos
+
     async def set_manual_grading_filter_show_all(self, tab_page: ExtendedIliasPage):
         filter_url = tab_page.get_manual_grading_filter_url()
         data = {"participant_status": "3", "cmd[applyManScoringParticipantsFilter]": "Filter+anwenden"}
@@ -7,6 +7,7 @@ from pathlib import Path
 from typing import Optional, cast, Callable, Awaitable
 
 import bs4
+import soupsieve
 from PFERD.crawl import CrawlError
 from PFERD.crawl.ilias.kit_ilias_html import IliasPage
 from PFERD.logging import log
@@ -31,9 +32,30 @@ from .spec import (
     ProgrammingQuestionAnswer,
 )
 
+_EDITOR_INIT_CALL_RE = re.compile(r"\('([^']+)','([^']+)'")
+_DOWNLOAD_TITLE_RE = re.compile(r"downloadtitle=([^&]+)")
+_QUESTION_HEADING_RE = re.compile("Frage:")
+_QUESTION_ID_RE = re.compile(r"\[ID: (\d+)]")
+_CMD_CLASS_RE = re.compile(r"cmdclass=([^&#]+)", re.IGNORECASE)
+# use classes here that are plausible for copy-pasted links
+_TEST_CMD_CLASS_RE = re.compile(
+    r"cmdclass=(?:ilobjtestgui|ilparticipantstestresultsgui|iltestscoringbyquestionsgui)", re.IGNORECASE
+)
+
+# selectors applied once per design block or graded question, compiled once instead of per call
+_CODE_BLOCK_SELECTOR = soupsieve.compile("table .ilc_Sourcecode .ilc_code_block_Code")
+_CODE_DOWNLOAD_LINK_SELECTOR = soupsieve.compile("a[href*='cmd=download_paragraph']")
+_MEDIA_CONTAINER_SELECTOR = soupsieve.compile(".ilc_media_cont_MediaContainer")
+_TEXT_ANSWER_SELECTOR = soupsieve.compile(".ilc_question_TextQuestion")
+_SOLUTION_BOX_SELECTOR = soupsieve.compile(".solutionbox")
+_FILE_ANSWER_SELECTOR = soupsieve.compile(".ilc_question_FileUpload")
+_DOWNLOADABLE_SELECTOR = soupsieve.compile('[download=""]')
+
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class ExtraFormData:
+    """A form value that has to be sent along. Identity (hash and equality) is the field name only."""
+
     name: str
     value: str
     disabled: bool
@@ -42,31 +64,29 @@ class ExtraFormData:
         return hash(self.name)
 
     def __eq__(self, other):
+        if not isinstance(other, ExtraFormData):
+            return NotImplemented
         return self.name == other.name
 
 
 class ExtendedIliasPage(IliasPage):
     def __init__(self, soup: BeautifulSoup, _page_url: str):
         super().__init__(soup, _page_url, None)
+        self._normalized_url = _page_url.lower()
+        self._question_ids_and_links: Optional[list[tuple[str, bs4.Tag]]] = None
+        self._form_targets: dict[str, tuple[str, bs4.Tag, bs4.Tag]] = {}
 
     def url(self):
         return self._page_url
 
     def normalized_url(self):
-        return self._page_url.lower()
+        return self._normalized_url
 
     def is_test_page(self):
         log.explain_topic("Verifying page is a test")
-        # use classes here that are plausible for copy-pasted links
-        possible_cmdclasses = (
-            "cmdclass=ilobjtestgui",
-            "cmdclass=ilparticipantstestresultsgui",
-            "cmdclass=iltestscoringbyquestionsgui",
-        )
-        for cmdclass in possible_cmdclasses:
-            if cmdclass in self.normalized_url():
-                log.explain("Page matched test url fragment")
-                return True
+        if _TEST_CMD_CLASS_RE.search(self._page_url):
+            log.explain("Page matched test url fragment")
+            return True
         header = self._soup.find(id="headerimage")
         if not header:
             log.explain("Could not find headerimage")
@@ -78,10 +98,13 @@ class ExtendedIliasPage(IliasPage):
         return False
 
     def is_test_create_page(self):
-        return "cmd=create" in self.normalized_url() and "new_type=tst" in self.normalized_url()
+        return "cmd=create" in self._normalized_url and "new_type=tst" in self._normalized_url
 
     def is_test_question_edit_page(self):
-        return "cmd=editquestion" in self.normalized_url()
+        return "cmd=editquestion" in self._normalized_url
+
+    def is_test_question_listing_page(self):
+        return "cmd=questions" in self._normalized_url and "ilobjtestgui" in self._normalized_url
 
     def get_test_create_url(self) -> Optional[str]:
         return self._abs_url_from_link(self._soup.find(id="tst"))
@@ -103,7 +126,7 @@ class ExtendedIliasPage(IliasPage):
             if not tab_list["id"].startswith("tab_"):
                 continue
             link = tab_list.find(name="a")
-            result[link.getText().strip()] = self._abs_url_from_link(link)
+            result[_stripped_text(link)] = self._abs_url_from_link(link)
 
         return result
 
@@ -118,7 +141,7 @@ class ExtendedIliasPage(IliasPage):
 
     def get_test_add_question_url(self):
         """Add a question to a test."""
-        button = self._soup.find(attrs={"onclick": lambda x: x and "cmd=addQuestion" in x})
+        button = self._soup.select_one("[onclick*='cmd=addQuestion']")
         if not button:
             raise CrawlError("Could not find add question button")
         start = button["onclick"].find("'")
@@ -143,47 +166,37 @@ class ExtendedIliasPage(IliasPage):
 
     @staticmethod
     def _get_extra_form_values(form: bs4.Tag) -> set[ExtraFormData]:
-        extra_values = set()
-        for inpt in form.find_all(name="input", attrs={"required": "required"}):
-            extra_values.add(
-                ExtraFormData(
-                    name=inpt["name"],
-                    value=inpt.get("value", ""),
-                    disabled=inpt.get("disabled", None) is not None,
-                )
-            )
-        for inpt in form.find_all(name="textarea", attrs={"required": "required"}):
-            extra_values.add(
-                ExtraFormData(
-                    name=inpt["name"],
-                    value=inpt.get("value", ""),
-                    disabled=inpt.get("disabled", None) is not None,
-                )
-            )
-        for select in form.find_all(name="select"):
-            extra_values.add(
-                ExtraFormData(
-                    name=select["name"],
-                    value=select.find(name="option", attrs={"selected": "selected"}).get("value", ""),
-                    disabled=select.get("disabled", None) is not None,
-                )
-            )
-
-        for inpt in form.find_all(name="input", attrs={"disabled": "disabled"}):
-            extra_values.add(ExtraFormData(name=inpt["name"], value="", disabled=True))
-        for select in form.find_all(name="select", attrs={"disabled": "disabled"}):
-            extra_values.add(ExtraFormData(name=select["name"], value="", disabled=True))
-        for select in form.find_all(name="textarea", attrs={"disabled": "disabled"}):
-            extra_values.add(ExtraFormData(name=select["name"], value="", disabled=True))
-
-        return extra_values
-
-    def _form_target_from_button(self, button_name: str):
+        # keyed by name: the first required input or select for a name wins, disabled elements only fill gaps
+        values: dict[str, ExtraFormData] = {}
+        disabled_names: list[str] = []
+        for elem in form.find_all(name=["input", "select", "textarea"]):
+            disabled = elem.get("disabled", None) is not None
+            if elem.name == "select":
+                name = elem["name"]
+                selected = elem.find(name="option", attrs={"selected": "selected"})
+                values.setdefault(name, ExtraFormData(name=name, value=selected.get("value", ""), disabled=disabled))
+            elif elem.get("required", None) == "required":
+                name = elem["name"]
+                values.setdefault(name, ExtraFormData(name=name, value=elem.get("value", ""), disabled=disabled))
+            elif elem.get("disabled", None) == "disabled":
+                disabled_names.append(elem["name"])
+
+        for name in disabled_names:
+            if name not in values:
+                values[name] = ExtraFormData(name=name, value="", disabled=True)
+
+        return set(values.values())
+
+    def _form_target_from_button(self, button_name: str) -> tuple[str, bs4.Tag, bs4.Tag]:
+        if cached := self._form_targets.get(button_name):
+            return cached
         btn = self._soup.find(attrs={"name": button_name})
         if not btn:
             raise CrawlError(f"Could not find {button_name!r} button")
         form = btn.find_parent(name="form")
-        return self._abs_url_from_relative(form["action"]), btn, form
+        result = self._abs_url_from_relative(form["action"]), btn, form
+        self._form_targets[button_name] = result
+        return result
 
     def get_test_question_after_values(self) -> dict[str, str]:
         position_select = self._soup.find(id="position")
@@ -191,7 +204,7 @@ class ExtendedIliasPage(IliasPage):
             raise CrawlError("Could not find element")
         results = {}
         for select in position_select.find_all("option"):
-            text: str = select.getText().strip()
+            text: str = _stripped_text(select)
             if "Nach" in text:
                 title = text[len("Nach") : text.rfind("[")].strip()
                 results[title] = select["value"]
@@ -201,28 +214,32 @@ class ExtendedIliasPage(IliasPage):
         """Returns { title -> question_id }"""
         ids = {}
         for question_id, title_link in self._get_test_question_ids_and_links():
-            ids[title_link.getText().strip()] = question_id
+            ids[_stripped_text(title_link)] = question_id
 
         return ids
 
     def _get_test_question_ids_and_links(self) -> list[tuple[str, bs4.Tag]]:
-        """Returns [(id, link tag for title)]"""
-        if "cmd=questions" not in self.normalized_url() or "ilobjtestgui" not in self.normalized_url():
+        """Returns [(id, link tag for title)]. The result is cached, callers must not modify it."""
+        if self._question_ids_and_links is not None:
+            return self._question_ids_and_links
+        if not self.is_test_question_listing_page():
             raise CrawlError("Not on test question page")
-        table = self._soup.find(name="table", id=lambda x: x and x.startswith("tst_qst_lst"))
+        table = self._soup.select_one("table[id^='tst_qst_lst']")
         if not table:
             raise CrawlError("Did not find questions table")
+        rows = table.select("tbody > tr")
+        order_tds = table.select("tbody > tr > td[name^='order[']")
+        if len(order_tds) != len(rows):
+            alert_message = ""
+            for alert in self._soup.select(".alert"):
+                alert_message += _stripped_text(alert)
+            raise CrawlError(f"Could not find order column. Page-Alerts: {alert_message}")
         result = []
-        for row in table.find(name="tbody").find_all(name="tr"):
-            order_td = row.find(name="td", attrs={"name": lambda x: x and x.startswith("order[")})
-            if not order_td:
-                alert_message = ""
-                for alert in self._soup.select(".alert"):
-                    alert_message += alert.getText().strip()
-                raise CrawlError(f"Could not find order column. Page-Alerts: {alert_message}")
+        for order_td in order_tds:
             question_id = cast(str, order_td["name"]).replace("order[", "").replace("]", "").strip()
-            result.append((question_id, row.find(name="a")))
+            result.append((question_id, order_td.parent.find(name="a")))
 
+        self._question_ids_and_links = result
         return result
 
     def get_test_question_save_order_data(self, question_to_position: dict[str, str]) -> tuple[str, dict[str, str]]:
@@ -236,25 +253,25 @@ class ExtendedIliasPage(IliasPage):
 
     def get_test_question_listing(self) -> list[tuple[str, str]]:
         """Returns [(title, url)] for all questions in a test."""
-        result = []
-        for _, link in self._get_test_question_ids_and_links():
-            result.append((link.getText().strip(), self._abs_url_from_link(link)))
-        return result
+        return [
+            (_stripped_text(link), self._abs_url_from_link(link)) for _, link in self._get_test_question_ids_and_links()
+        ]
 
     def get_test_question_edit_url(self):
-        return self._abs_url_from_link(
-            self._soup.find(name="a", attrs={"href": lambda x: x and "cmd=editQuestion" in x})
-        )
+        return self._abs_url_from_link(self._soup.select_one("a[href*='cmd=editQuestion']"))
 
     def get_test_question_reconstruct_from_edit(self, page_design: list[PageDesignBlock]):
-        if "cmd=editquestion" not in self.normalized_url():
+        if "cmd=editquestion" not in self._normalized_url:
             raise CrawlError("Not on question edit page")
         title = _norm(self._soup.find(id="title")["value"].strip())
         author = _norm(self._soup.find(id="author")["value"].strip())
         summary = _norm(self._soup.find(id="comment").get("value", "").strip())
-        question_html = _norm(self._soup.find(id="question").getText().strip())
+        question_html = _norm(_stripped_text(self._soup.find(id="question")))
 
-        if "asstextquestiongui" in self.normalized_url():
+        cmd_class_match = _CMD_CLASS_RE.search(self._page_url)
+        cmd_class = cmd_class_match.group(1).lower() if cmd_class_match else ""
+
+        if cmd_class == "asstextquestiongui":
             # free from text
             points = float(self._soup.find(id="non_keyword_points")["value"].strip())
             return QuestionFreeFormText(
@@ -265,7 +282,7 @@ class ExtendedIliasPage(IliasPage):
                 page_design=page_design,
                 points=points,
             )
-        elif "cmdclass=assfileuploadgui" in self.normalized_url():
+        elif cmd_class == "assfileuploadgui":
             # file upload
             max_size_bytes = int(self._soup.find(id="maxsize").get("value", "2097152").strip())
             allowed_extensions = self._soup.find(id="allowedextensions").get("value", "").strip().split(",")
@@ -280,15 +297,14 @@ class ExtendedIliasPage(IliasPage):
                 allowed_extensions=allowed_extensions,
                 max_size_bytes=max_size_bytes,
             )
-        elif "cmdclass=asssinglechoicegui" in self.normalized_url():
+        elif cmd_class == "asssinglechoicegui":
             shuffle = True if self._soup.find(id="shuffle").get("checked", None) else False
-            answer_table = self._soup.find(name="table", attrs={"class": lambda x: x and "singlechoicewizard" in x})
+            answer_table = self._soup.select_one("table[class*='singlechoicewizard']")
+            elements_by_id = {elem["id"]: elem for elem in answer_table.find_all(id=True)}
             answers = []
-            for inpt in answer_table.find_all(name="input", id=lambda x: x and x.startswith("choice[answer]")):
+            for inpt in answer_table.select("input[id^='choice[answer]']"):
                 answer_value = _norm(inpt.get("value", ""))
-                answer_points = float(
-                    answer_table.find(id=inpt["id"].replace("answer", "points")).get("value", "0").strip()
-                )
+                answer_points = float(elements_by_id[inpt["id"].replace("answer", "points")].get("value", "0").strip())
                 answers.append((answer_value, answer_points))
 
             return QuestionSingleChoice(
@@ -300,20 +316,21 @@ class ExtendedIliasPage(IliasPage):
                 shuffle=shuffle,
                 answers=answers,
             )
-        elif "cmdclass=assmultiplechoicegui" in self.normalized_url():
+        elif cmd_class == "assmultiplechoicegui":
             shuffle = True if self._soup.find(id="shuffle").get("checked", None) else False
             selection_limit = self._soup.find(id="selection_limit").get("value", None)
             if selection_limit is not None:
                 selection_limit = int(selection_limit)
-            answer_table = self._soup.find(name="table", attrs={"class": lambda x: x and "multiplechoicewizard" in x})
+            answer_table = self._soup.select_one("table[class*='multiplechoicewizard']")
+            elements_by_id = {elem["id"]: elem for elem in answer_table.find_all(id=True)}
             answers = []
-            for inpt in answer_table.find_all(name="input", id=lambda x: x and x.startswith("choice[answer]")):
+            for inpt in answer_table.select("input[id^='choice[answer]']"):
                 answer_value = _norm(inpt.get("value", ""))
                 answer_points_checked = float(
-                    answer_table.find(id=inpt["id"].replace("answer", "points")).get("value", "0").strip()
+                    elements_by_id[inpt["id"].replace("answer", "points")].get("value", "0").strip()
                 )
                 answer_points_unchecked = float(
-                    answer_table.find(id=inpt["id"].replace("answer", "points_unchecked")).get("value", "0").strip()
+                    elements_by_id[inpt["id"].replace("answer", "points_unchecked")].get("value", "0").strip()
                 )
                 answers.append(
                     QuestionMultipleChoice.Answer(answer_value, answer_points_checked, answer_points_unchecked)
@@ -333,7 +350,7 @@ class ExtendedIliasPage(IliasPage):
             raise CrawlError(f"Unknown question type at '{self.url()}'")
 
     def get_test_question_design_page_url(self):
-        link = self._soup.find(attrs={"href": lambda x: x and "cmdclass=ilassquestionpagegui" in x.lower()})
+        link = self._soup.select_one("[href*='cmdclass=ilassquestionpagegui' i]")
         if not link:
             raise CrawlError("Could not find page edit button")
         return self._abs_url_from_link(link)
@@ -344,17 +361,18 @@ class ExtendedIliasPage(IliasPage):
         First url is the base for text and images, the second for e.g. code
         """
         for script in self._soup.find_all(name="script"):
-            if not isinstance(script, bs4.Tag):
-                continue
-            text = "".join([str(x) for x in script.contents])
-            if "il.copg.editor.init" in text:
-                candidates = [line.strip() for line in text.splitlines() if "il.copg.editor.init" in line]
-                if not candidates:
-                    raise CrawlError("Found no init call candidate")
-                init_call = candidates[0]
-                match = re.search(r"\('([^']+)','([^']+)'", init_call)
+            text = script.string
+            if text is None:
+                text = "".join([str(x) for x in script.contents])
+            init_start = text.find("il.copg.editor.init")
+            if init_start >= 0:
+                # only look at the line containing the init call
+                line_start = text.rfind("\n", 0, init_start) + 1
+                line_end = text.find("\n", init_start)
+                init_call = text[line_start : line_end if line_end >= 0 else len(text)].strip()
+                match = _EDITOR_INIT_CALL_RE.search(init_call)
                 if not match:
-                    raise CrawlError(f"Editor init call has unknown format: {candidates[0]!r}")
+                    raise CrawlError(f"Editor init call has unknown format: {init_call!r}")
                 return match.group(1), self._abs_url_from_relative(match.group(2))
         raise CrawlError("Could not find copg editor base url")
 
@@ -368,39 +386,35 @@ class ExtendedIliasPage(IliasPage):
         after_start = False
         blocks: list[PageDesignBlock] = []
 
-        for child in form.children:
-            if not isinstance(child, bs4.Tag):
-                continue
-            if "ilc_page_title_PageTitle" in child.get("class", []):
+        for child in form.find_all(recursive=False):
+            child_classes = child.get("class", [])
+            if "ilc_page_title_PageTitle" in child_classes:
                 after_start = True
                 continue
             if not after_start:
                 continue
-            child_classes = child.get("class", [])
             if "ilc_Paragraph" in child_classes:
                 log.explain("Found text block")
                 blocks.append(PageDesignBlockText(_normalize_tag_for_design_block(child)))
                 continue
             if "ilc_Code" in child_classes:
                 log.explain("Found code block")
-                code = child.select_one("table .ilc_Sourcecode .ilc_code_block_Code")
-                for br in code.find_all(name="br"):
-                    br.replace_with("\n")
-                download_link = child.find(name="a", attrs={"href": lambda x: x and "cmd=download_paragraph" in x})
+                code = _CODE_BLOCK_SELECTOR.select_one(child)
+                download_link = _CODE_DOWNLOAD_LINK_SELECTOR.select_one(child)
                 name = "unknown.c"
                 if download_link:
-                    if match := re.search(r"downloadtitle=([^&]+)", download_link["href"]):
+                    if match := _DOWNLOAD_TITLE_RE.search(download_link["href"]):
                         name = match.group(1)
 
                 blocks.append(
                     PageDesignBlockCode(
-                        code=_norm(code.getText().strip()),
+                        code=_norm(_text_with_line_breaks(code).strip()),
                         language="c",  # guess
                         name=_norm(name),
                     )
                 )
                 continue
-            if media_container := child.select_one(".ilc_media_cont_MediaContainer"):
+            if media_container := _MEDIA_CONTAINER_SELECTOR.select_one(child):
                 log.explain("Found image block")
                 img = media_container.find(name="img")
                 if not img:
@@ -408,7 +422,7 @@ class ExtendedIliasPage(IliasPage):
                 path = await downloader(img["src"])
                 blocks.append(PageDesignBlockImage(image_path=path))
                 continue
-            if "ilc_question_" in str(child_classes):
+            if any("ilc_question_" in cls for cls in child_classes):
                 break
 
             log.warn(f"Found unknown design block: {child_classes!r}")
@@ -418,19 +432,26 @@ class ExtendedIliasPage(IliasPage):
     def get_test_reconstruct_from_properties(self, questions: list[TestQuestion]) -> IliasTest:
         return IliasTest(
             title=_norm(self._soup.find(id="title").get("value", "")),
-            description=_norm("".join([str(x) for x in self._soup.find(id="description").contents])),
-            intro_text=_norm("".join([str(x) for x in self._soup.find(id="introduction").contents])),
+            description=_norm(self._soup.find(id="description").decode_contents(formatter=None)),
+            intro_text=_norm(self._soup.find(id="introduction").decode_contents(formatter=None)),
             starting_time=_parse_time(self._soup.find(id="starting_time")),
             ending_time=_parse_time(self._soup.find(id="ending_time")),
             number_of_tries=int(self._soup.find(id="nr_of_tries").get("value", "100")),
             questions=questions,
         )
 
+    def get_test_intro_text(self) -> Optional[str]:
+        """Returns the intro text of a settings page, or None if this is not one (e.g. an error page)."""
+        introduction = self._soup.find(id="introduction")
+        if not introduction:
+            return None
+        return _norm(introduction.decode_contents(formatter=None))
+
     def get_test_question_design_last_component_id(self) -> str:
         editor = self._soup.find(id="ilEditorTD")
         if not editor:
             raise CrawlError("Could not find editor")
-        candidates: list[bs4.Tag] = list(editor.find_all(name="div", id=lambda x: x and x.startswith("pc")))
+        candidates: list[bs4.Tag] = list(editor.select("div[id^='pc']"))
         # question is always last, so return the one before it :)
         if len(candidates) >= 2:
             last = candidates[-2]
@@ -438,10 +459,7 @@ class ExtendedIliasPage(IliasPage):
         return ""
 
     def get_scoring_settings_url(self):
-        link = self._soup.find(
-            name="a",
-            attrs={"href": lambda x: x and "ilobjtestsettingsscoringresultsgui" in x.lower()},
-        )
+        link = self._soup.select_one("a[href*='ilobjtestsettingsscoringresultsgui' i]")
         if not link:
             raise CrawlError("Could not find scoring settings url on test page")
         return self._abs_url_from_link(link)
@@ -455,13 +473,17 @@ class ExtendedIliasPage(IliasPage):
         return self._abs_url_from_relative(form["action"]), extra_values
 
     def get_test_scoring_name_for_label(self, label_regex: str) -> list[str]:
+        label_pattern = re.compile(label_regex, re.IGNORECASE)
+        labels_by_target: dict[str, bs4.Tag] = {}
+        for label in self._soup.find_all(name="label", attrs={"for": True}):
+            labels_by_target.setdefault(label["for"], label)
+
         results = []
-        for inp in self._soup.find_all(name="input"):
-            input_id = inp.get("id", "")
-            label = self._soup.find("label", attrs={"for": input_id})
-            if not label or not input_id:
+        for inp in self._soup.find_all(name="input", id=True):
+            label = labels_by_target.get(inp["id"])
+            if not label:
                 continue
-            if re.match(label_regex, label.getText().strip(), re.IGNORECASE):
+            if label_pattern.match(_stripped_text(label)):
                 results.append(inp.get("name", ""))
         return results
 
@@ -472,7 +494,7 @@ class ExtendedIliasPage(IliasPage):
         return names
 
     def get_manual_grading_per_participant_url(self):
-        link = self._soup.find(name="a", attrs={"href": lambda x: x and "cmd=showManScoringParticipantsTable" in x})
+        link = self._soup.select_one("a[href*='cmd=showManScoringParticipantsTable']")
         if link is not None:
             return self._abs_url_from_link(link)
         return None
@@ -485,12 +507,15 @@ class ExtendedIliasPage(IliasPage):
         participants = []
         table = self._soup.find(name="table", id="manScorePartTable")
         for row in table.select("tbody > tr"):
-            cols = list(row.select("td"))
-            last_name = cols[0].getText().strip()
-            first_name = cols[1].getText().strip()
-            email = cols[2].getText().strip()
+            cols = row.find_all(name="td", recursive=False, limit=4)
+            if len(cols) < 4:
+                # e.g. the single-cell "no entries" row of an empty table
+                continue
+            last_name = _stripped_text(cols[0])
+            first_name = _stripped_text(cols[1])
+            email = _stripped_text(cols[2])
             username = email.split("@")[0]
-            detail_link = self._abs_url_from_link(cols[3].select_one("a"))
+            detail_link = self._abs_url_from_link(cols[3].find(name="a"))
             participants.append(ManualGradingParticipantInfo(last_name, first_name, email, username, detail_link))
         return participants
 
@@ -498,20 +523,29 @@ class ExtendedIliasPage(IliasPage):
         self, participant: ManualGradingParticipantInfo
     ) -> ManualGradingParticipantResults:
         questions: list[ManualGradingGradedQuestion] = []
-        for question in self._soup.find_all(name="h2", string=re.compile("Frage:")):
-            match = re.compile(r"\[ID: (\d+)]").search(question.getText())
+        # index once instead of scanning the whole page per question. Keep the first match, like select_one
+        elements_by_id: dict[str, bs4.Tag] = {}
+        for elem in self._soup.select("[id^='il_prop_cont_question__'], [id^='question__']"):
+            elements_by_id.setdefault(elem["id"], elem)
+        feedback_elements: dict[str, bs4.Tag] = {}
+        for elem in self._soup.select("[name^='question__']"):
+            feedback_elements.setdefault(elem["name"], elem)
+
+        for question in self._soup.find_all(name="h2", string=_QUESTION_HEADING_RE):
+            match = _QUESTION_ID_RE.search(question.getText())
             question_id = match.group(1)
             answer_type, answer_value = self._get_manual_grading_participant_answer(
                 question.find_next(id="il_prop_cont_")
             )
-            points = self._soup.select_one(f"#il_prop_cont_question__{question_id}__points input").get("value", "0")
-            max_points = self._soup.select_one(f"#question__{question_id}__maxpoints").getText().strip()
-            feedback_element = self._soup.select_one(f"[name=question__{question_id}__feedback]")
+            points_container = elements_by_id.get(f"il_prop_cont_question__{question_id}__points")
+            points = points_container.find(name="input").get("value", "0")
+            max_points = _stripped_text(elements_by_id.get(f"question__{question_id}__maxpoints"))
+            feedback_element = feedback_elements.get(f"question__{question_id}__feedback")
 
             match feedback_element.name:
                 # The feedback hasn't been finalized yet => It is represented as a text area
                 case "textarea":
-                    feedback = feedback_element.getText().strip()
+                    feedback = _stripped_text(feedback_element)
                 case "input":
                     feedback = feedback_element.get("value")
                 case _:
@@ -525,7 +559,7 @@ class ExtendedIliasPage(IliasPage):
 
             questions.append(
                 ManualGradingGradedQuestion(
-                    ManualGradingQuestion(question_id, question.getText().strip(), float(max_points), answer_type),
+                    ManualGradingQuestion(question_id, _stripped_text(question), float(max_points), answer_type),
                     answer_value,
                     float(points),
                     feedback,
@@ -538,12 +572,14 @@ class ExtendedIliasPage(IliasPage):
     def _get_manual_grading_participant_answer(
         user_answer: bs4.Tag,
     ) -> Optional[tuple[ManualGradingQuestionType, str | list[ProgrammingQuestionAnswer]]]:
-        if text_answer := user_answer.select_one(".ilc_question_TextQuestion"):
-            text_answer = text_answer.select_one(".solutionbox")
+        if text_answer := _TEXT_ANSWER_SELECTOR.select_one(user_answer):
+            text_answer = _SOLUTION_BOX_SELECTOR.select_one(text_answer)
             if text_answer:
                 return "freeform_text", text_answer.decode_contents()
-        elif file_answer := user_answer.select_one(".ilc_question_FileUpload"):
-            downloadables = [(file.getText().strip(), file["href"]) for file in file_answer.select('[download=""]')]
+        elif file_answer := _FILE_ANSWER_SELECTOR.select_one(user_answer):
+            downloadables = [
+                (_stripped_text(file), file["href"]) for file in _DOWNLOADABLE_SELECTOR.select(file_answer)
+            ]
             return "file_upload", [ProgrammingQuestionAnswer(name, uri) for name, uri in downloadables]
         return None
 
@@ -552,25 +588,30 @@ class ExtendedIliasPage(IliasPage):
 
     @staticmethod
     def page_has_success_alert(page: "ExtendedIliasPage") -> bool:
-        if ExtendedIliasPage.page_has_failure_alert(page):
-            return False
-        for alert in page._soup.find_all(attrs={"role": ["status", "alert"]}):
-            if "alert-success" in alert.get("class", ""):
-                return True
-        return False
+        has_success_alert, has_danger_alert = ExtendedIliasPage._classify_alerts(page)
+        return has_success_alert and not has_danger_alert
 
     @staticmethod
     def page_has_failure_alert(page: "ExtendedIliasPage") -> bool:
+        return ExtendedIliasPage._classify_alerts(page)[1]
+
+    @staticmethod
+    def _classify_alerts(page: "ExtendedIliasPage") -> tuple[bool, bool]:
+        """Returns (has success alert, has danger alert) and logs all danger alerts."""
+        has_success_alert = False
         has_danger_alert = False
         for alert in page._soup.find_all(attrs={"role": ["alert", "status"]}):
-            if "alert-danger" in alert.get("class", ""):
+            classes = alert.get("class", [])
+            if "alert-danger" in classes:
                 log.warn("Got danger alert")
-                log.warn_contd("  " + alert.getText().strip())
+                log.warn_contd("  " + _stripped_text(alert))
                 has_danger_alert = True
-        return has_danger_alert
+            elif "alert-success" in classes:
+                has_success_alert = True
+        return has_success_alert, has_danger_alert
 
     def get_test_dashboard_end_all_passes_url(self) -> Optional[str]:
-        link = self._soup.find(name="a", attrs={"href": lambda x: x and "cmd=finishAllUserPasses" in x})
+        link = self._soup.select_one("a[href*='cmd=finishAllUserPasses']")
         if not link:
             return None
         return self._abs_url_from_link(link)
@@ -583,23 +624,55 @@ def _parse_time(time_input: bs4.Tag) -> Optional[datetime.datetime]:
     time_str = time_input.get("value", None)
     if not time_str:
         return None
+    # fast path for the zero-padded "dd.mm.YYYY HH:MM" ILIAS renders, strptime handles anything else
+    if len(time_str) == 16 and time_str[2] == "." and time_str[5] == "." and time_str[13] == ":":
+        try:
+            return datetime.datetime(
+                int(time_str[6:10]), int(time_str[3:5]), int(time_str[0:2]), int(time_str[11:13]), int(time_str[14:16])
+            )
+        except ValueError:
+            pass
     return datetime.datetime.strptime(time_str, "%d.%m.%Y %H:%M")
 
 
+_ILFILEHASH_ALPHABET = string.ascii_lowercase + "0123456789"
+
+
 def random_ilfilehash() -> str:
-    return "".join(random.choice(string.ascii_lowercase + "0123456789") for _ in range(32))
+    return "".join(random.choices(_ILFILEHASH_ALPHABET, k=32))
 
 
 def _norm(inpt: str) -> str:
     return inpt.strip().replace("\u00a0", " ").replace("\r\n", "\n")
 
 
-def _normalize_tag_for_design_block(element: bs4.Tag):
-    # remove class from <code> as ILIAS crashes otherwise
-    for elem in element.find_all(name="code"):
-        del elem["class"]
+def _stripped_text(element: bs4.Tag) -> str:
+    """Stripped text of a tag. Tags wrapping a single string skip the generic getText walk."""
+    string = element.string
+    if string is not None and not isinstance(string, bs4.element.PreformattedString):
+        return string.strip()
+    return element.getText().strip()
+
+
+def _text_with_line_breaks(element: bs4.Tag) -> str:
+    """Like getText, but renders <br> as a newline without modifying the tree."""
+    parts = []
+    for descendant in element.descendants:
+        if isinstance(descendant, bs4.Tag):
+            if descendant.name == "br":
+                parts.append("\n")
+        elif not isinstance(descendant, bs4.element.PreformattedString):
+            parts.append(descendant)
+    return "".join(parts)
 
-    for comment in element.findAll(text=lambda text: isinstance(text, bs4.Comment)):
-        comment.extract()
+
+def _normalize_tag_for_design_block(element: bs4.Tag):
+    # snapshot the descendants, as extracting comments mutates the tree
+    for elem in list(element.descendants):
+        if isinstance(elem, bs4.Comment):
+            elem.extract()
+        elif isinstance(elem, bs4.Tag) and elem.name == "code":
+            # remove class from <code> as ILIAS crashes otherwise
+            del elem["class"]
 
     return _norm(element.decode_contents())
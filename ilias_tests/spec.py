@@ -1,22 +1,53 @@
 import abc
+import ast
 import datetime
+import functools
+import operator
+import os
 import re
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
-from typing import Optional, Any, Union, Literal, TYPE_CHECKING
+from typing import Optional, Any, Union, Literal, TYPE_CHECKING, Callable, TextIO
 
 import markdown2
 import yaml
 from PFERD.crawl import CrawlError
 from PFERD.logging import log
-from PFERD.utils import soupify
-from markdownify import markdownify
+from markdownify import MarkdownConverter
 from slugify import slugify
 
 if TYPE_CHECKING:
     from .ilias_action import IliasInteractor
 
+_SPACE_BEFORE_PARAGRAPH_RE = re.compile(r"\s+<p>")
+_EMPTY_PARAGRAPH_RE = re.compile(r"<p[^>]+>(\s|&nbsp;)+</p>\n*")
+_SPACE_BEFORE_PRE_RE = re.compile(r"\s+<pre>")
+_SPACE_AFTER_PARAGRAPH_RE = re.compile(r"</p>(\s|\n)+")
+# collapses newlines before code fences and unescapes underscores after markdownify
+_MARKDOWN_FIXUP_RE = re.compile(r"\n+```|\\_")
+_BLOCKQUOTE_OPEN_RE = re.compile(r"<blockquote(?:\s[^>]*)?>")
+# the converter keeps no state between conversions, so build (and validate the options of) it only once
+_MARKDOWN_CONVERTER = MarkdownConverter(escape_misc=False, escape_underscore=False, escape_asterisks=False)
+_STYLED_BLOCKQUOTE_DIV = '<div style="border-left: 4px solid #d1d9e0; color: #59636e; padding-left: 1em;">'
+# the only calls and operators allowed in size and time expressions of a spec, see _eval_spec_expression
+_SPEC_EXPRESSION_CALLS: dict[str, Callable[..., Any]] = {
+    "datetime.datetime": datetime.datetime,
+    "datetime.datetime.now": datetime.datetime.now,
+    "datetime.datetime.fromisoformat": datetime.datetime.fromisoformat,
+    "datetime.timedelta": datetime.timedelta,
+}
+_SPEC_EXPRESSION_OPERATORS: dict[type[ast.operator], Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Pow: operator.pow,
+}
+# "## mail (last, first)" headings written by manual_grading_write_question_md
+_STUDENT_HEADING_RE = re.compile(r"^## (?P<email>[^(\n]*)\((?P<name>[^)\n]*)\)", re.MULTILINE)
+
 
 class QuestionType(Enum):
     SINGLE_CHOICE = 1
@@ -49,7 +80,7 @@ def str_presenter(dumper, data):
     Ref: https://stackoverflow.com/questions/8640959/how-can-i-control-what-scalar-form-pyyaml-uses-for-my-data
     Ref: https://github.com/yaml/pyyaml/issues/240#issuecomment-1096224358
     """
-    if data.count("\n") > 0 or data.count("<p>") > 0:
+    if "\n" in data or "<p>" in data:
         return dumper.represent_scalar("tag:yaml.org,2002:str", data, style="|")
     return dumper.represent_scalar("tag:yaml.org,2002:str", data)
 
@@ -57,6 +88,11 @@ def str_presenter(dumper, data):
 yaml.add_representer(str, str_presenter)
 yaml.representer.SafeRepresenter.add_representer(str, str_presenter)  # to use with safe_dum
 
+# the libyaml based loader and dumper are a lot faster, but only available if PyYAML was built against libyaml
+_YamlSafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_YamlSafeDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+yaml.add_representer(str, str_presenter, Dumper=_YamlSafeDumper)
+
 
 def load_freeform_question(
     title: str, author: str, summary: str, question_html: str, page_design: list["PageDesignBlock"], yml: dict[Any, Any]
@@ -82,10 +118,18 @@ def load_upload_file_question(
         page_design=page_design,
         points=yml["points"],
         allowed_extensions=yml["allowed_filetypes"],
-        max_size_bytes=eval(str(yml["max_bytes"])),
+        max_size_bytes=_parse_byte_size(yml["max_bytes"]),
     )
 
 
+def _parse_byte_size(value: int | float | str) -> int:
+    """Parses a number or an arithmetic expression like '2 * 1024 * 1024' or '2**20'."""
+    size = value if isinstance(value, (int, float)) else _eval_spec_expression(value)
+    if isinstance(size, bool) or not isinstance(size, (int, float)):
+        raise CrawlError(f"Invalid byte size {value!r}, expected a number")
+    return int(size)
+
+
 def load_single_choice_question(
     title: str, author: str, summary: str, question_html: str, page_design: list["PageDesignBlock"], yml: dict[Any, Any]
 ):
@@ -124,7 +168,17 @@ def load_multiple_choice_question(
     )
 
 
+_QUESTION_LOADERS = {
+    "file_upload": load_upload_file_question,
+    "freeform_text": load_freeform_question,
+    "single_choice": load_single_choice_question,
+    "multiple_choice": load_multiple_choice_question,
+}
+
+
 class PageDesignBlock(abc.ABC):
+    __slots__ = ()
+
     @abc.abstractmethod
     def serialize(self) -> dict[str, Any]: ...
 
@@ -132,17 +186,15 @@ class PageDesignBlock(abc.ABC):
     def deserialize(yml: dict[str, Any]):
         if "type" not in yml:
             raise CrawlError("Could not find 'type' for block")
-        if yml["type"] == "text":
-            return PageDesignBlockText.deserialize(yml)
-        elif yml["type"] == "image":
-            return PageDesignBlockImage.deserialize(yml)
-        elif yml["type"] == "code":
-            return PageDesignBlockCode.deserialize(yml)
-        else:
+        deserializer = _PAGE_DESIGN_BLOCK_DESERIALIZERS.get(yml["type"])
+        if deserializer is None:
             raise CrawlError(f"Unknown type {yml['type']!r}")
+        return deserializer(yml)
 
 
 class PageDesignBlockText(PageDesignBlock):
+    __slots__ = ("text_html",)
+
     def __init__(self, text_html: str):
         self.text_html = text_html
 
@@ -155,6 +207,8 @@ class PageDesignBlockText(PageDesignBlock):
 
 
 class PageDesignBlockImage(PageDesignBlock):
+    __slots__ = ("image",)
+
     def __init__(self, image_path: Path):
         self.image = image_path
 
@@ -167,6 +221,8 @@ class PageDesignBlockImage(PageDesignBlock):
 
 
 class PageDesignBlockCode(PageDesignBlock):
+    __slots__ = ("code", "language", "name")
+
     def __init__(self, code: str, language: str, name: str):
         self.code = code
         self.language = language
@@ -180,7 +236,16 @@ class PageDesignBlockCode(PageDesignBlock):
         return PageDesignBlockCode(yml["code"], yml["language"], yml["name"])
 
 
+_PAGE_DESIGN_BLOCK_DESERIALIZERS: dict[str, Callable[[dict[str, Any]], PageDesignBlock]] = {
+    "text": PageDesignBlockText.deserialize,
+    "image": PageDesignBlockImage.deserialize,
+    "code": PageDesignBlockCode.deserialize,
+}
+
+
 class TestQuestion(abc.ABC):
+    __slots__ = ("author", "page_design", "question_html", "question_type", "summary", "title")
+
     def __init__(
         self,
         title: str,
@@ -224,19 +289,15 @@ class TestQuestion(abc.ABC):
         question_html = yml["question_html"]
         page_design = [PageDesignBlock.deserialize(x) for x in yml["page_design"]]
 
-        if str_type == "file_upload":
-            return load_upload_file_question(title, author, summary, question_html, page_design, yml)
-        elif str_type == "freeform_text":
-            return load_freeform_question(title, author, summary, question_html, page_design, yml)
-        elif str_type == "single_choice":
-            return load_single_choice_question(title, author, summary, question_html, page_design, yml)
-        elif str_type == "multiple_choice":
-            return load_multiple_choice_question(title, author, summary, question_html, page_design, yml)
-        else:
+        loader = _QUESTION_LOADERS.get(str_type)
+        if loader is None:
             raise CrawlError(f"Unknown question type {str_type}")
+        return loader(title, author, summary, question_html, page_design, yml)
 
 
 class QuestionFreeFormText(TestQuestion):
+    __slots__ = ("points",)
+
     def __init__(
         self,
         title: str,
@@ -250,19 +311,24 @@ class QuestionFreeFormText(TestQuestion):
         self.points = points
 
     def get_options(self) -> dict[str, Union[str, Path]]:
-        return {
-            **super().get_options(),
-            "scoring_mode": "non",  # manual
-            "non_keyword_points": str(self.points),
-            "all_keyword_points": str(self.points),
-            "one_keyword_points": str(self.points),
-        }
+        options = super().get_options()
+        points = str(self.points)
+        options["scoring_mode"] = "non"  # manual
+        options["non_keyword_points"] = points
+        options["all_keyword_points"] = points
+        options["one_keyword_points"] = points
+        return options
 
     def serialize(self) -> dict[str, Any]:
-        return {**super().serialize(), "points": self.points, "type": "freeform_text"}
+        serialized = super().serialize()
+        serialized["points"] = self.points
+        serialized["type"] = "freeform_text"
+        return serialized
 
 
 class QuestionUploadFile(TestQuestion):
+    __slots__ = ("allowed_extensions", "max_size_bytes", "points")
+
     def __init__(
         self,
         title: str,
@@ -280,24 +346,28 @@ class QuestionUploadFile(TestQuestion):
         self.max_size_bytes = max_size_bytes
 
     def get_options(self) -> dict[str, Union[str, Path]]:
-        return {
-            **super().get_options(),
-            "allowedextensions": ",".join(self.allowed_extensions),
-            "maxsize": str(self.max_size_bytes),
-            "points": str(self.points),
-        }
+        options = super().get_options()
+        options["allowedextensions"] = ",".join(self.allowed_extensions)
+        options["maxsize"] = str(self.max_size_bytes)
+        options["points"] = str(self.points)
+        return options
 
     def serialize(self) -> dict[str, Any]:
-        return {
-            **super().serialize(),
-            "allowed_filetypes": self.allowed_extensions,
-            "max_bytes": self.max_size_bytes,
-            "points": self.points,
-            "type": "file_upload",
-        }
+        serialized = super().serialize()
+        serialized["allowed_filetypes"] = self.allowed_extensions
+        serialized["max_bytes"] = self.max_size_bytes
+        serialized["points"] = self.points
+        serialized["type"] = "file_upload"
+        return serialized
+
+
+# sent as an empty file upload for the answer images we do not support
+_NO_IMAGE = Path("")
 
 
 class QuestionSingleChoice(TestQuestion):
+    __slots__ = ("answers", "shuffle")
+
     def __init__(
         self,
         title: str,
@@ -316,30 +386,29 @@ class QuestionSingleChoice(TestQuestion):
         # choice[answer][0]
         # choice[image][0]"; filename="", octet-stream
         # choice[points][0]
-        answer_options: dict[str, Union[str, Path]] = {}
+        options = super().get_options()
         for index, (answer, points) in enumerate(self.answers):
-            answer_options[f"choice[answer][{index}]"] = answer
-            answer_options[f"choice[answer_id][{index}]"] = "-1"
-            answer_options[f"choice[image][{index}]"] = Path("")
-            answer_options[f"choice[points][{index}]"] = str(points)
+            options[f"choice[answer][{index}]"] = answer
+            options[f"choice[answer_id][{index}]"] = "-1"
+            options[f"choice[image][{index}]"] = _NO_IMAGE
+            options[f"choice[points][{index}]"] = str(points)
 
-        return {
-            **super().get_options(),
-            **answer_options,
-            "shuffle": "1" if self.shuffle else "0",
-            "types": "0",  # single line answers for now
-            "thumb_size": "150",  # image preview size. Not supported for now.
-        }
+        options["shuffle"] = "1" if self.shuffle else "0"
+        options["types"] = "0"  # single line answers for now
+        options["thumb_size"] = "150"  # image preview size. Not supported for now.
+        return options
 
     def serialize(self) -> dict[str, Any]:
-        answers = []
-        for title, points in self.answers:
-            answers.append({"answer": title, "points": points})
-
-        return {**super().serialize(), "answers": answers, "shuffle": self.shuffle, "type": "single_choice"}
+        serialized = super().serialize()
+        serialized["answers"] = [{"answer": title, "points": points} for title, points in self.answers]
+        serialized["shuffle"] = self.shuffle
+        serialized["type"] = "single_choice"
+        return serialized
 
 
 class QuestionMultipleChoice(TestQuestion):
+    __slots__ = ("answers", "selection_limit", "shuffle")
+
     @dataclass
     class Answer:
         answer: str
@@ -366,34 +435,92 @@ class QuestionMultipleChoice(TestQuestion):
         # choice[answer][0]
         # choice[image][0]"; filename="", octet-stream
         # choice[points][0]
-        answer_options: dict[str, Union[str, Path]] = {}
+        options = super().get_options()
         for index, answer in enumerate(self.answers):
-            answer_options[f"choice[answer][{index}]"] = answer.answer
-            answer_options[f"choice[answer_id][{index}]"] = "-1"
-            answer_options[f"choice[image][{index}]"] = Path("")
-            answer_options[f"choice[points][{index}]"] = str(answer.points)
-            answer_options[f"choice[points_unchecked][{index}]"] = str(answer.points_unchecked)
-
-        return {
-            **super().get_options(),
-            **answer_options,
-            "shuffle": "1" if self.shuffle else "0",
-            "types": "0",  # single line answers for now
-            "thumb_size": "150",  # image preview size. Not supported for now.
-        } | (dict() if self.selection_limit is None else {"selection_limit": str(self.selection_limit)})
+            options[f"choice[answer][{index}]"] = answer.answer
+            options[f"choice[answer_id][{index}]"] = "-1"
+            options[f"choice[image][{index}]"] = _NO_IMAGE
+            options[f"choice[points][{index}]"] = str(answer.points)
+            options[f"choice[points_unchecked][{index}]"] = str(answer.points_unchecked)
+
+        options["shuffle"] = "1" if self.shuffle else "0"
+        options["types"] = "0"  # single line answers for now
+        options["thumb_size"] = "150"  # image preview size. Not supported for now.
+        if self.selection_limit is not None:
+            options["selection_limit"] = str(self.selection_limit)
+        return options
 
     def serialize(self) -> dict[str, Any]:
-        # The typechecker is wrong, see https://youtrack.jetbrains.com/issue/PY-76059/.
-        # noinspection PyTypeChecker
-        answers = [asdict(answer) for answer in self.answers]
+        serialized = super().serialize()
+        serialized["answers"] = [
+            {"answer": answer.answer, "points": answer.points, "points_unchecked": answer.points_unchecked}
+            for answer in self.answers
+        ]
+        serialized["shuffle"] = self.shuffle
+        serialized["type"] = "multiple_choice"
+        serialized["selection_limit"] = self.selection_limit
+        return serialized
+
+
+def _parse_spec_time(value: str) -> datetime.datetime:
+    """
+    Parses a time given as a string in the spec: an ISO timestamp or an expression like
+    'datetime.datetime.now() + datetime.timedelta(hours=5)'.
+    """
+    try:
+        return datetime.datetime.fromisoformat(value.strip())
+    except ValueError:
+        pass
+    time = _eval_spec_expression(value)
+    if not isinstance(time, datetime.datetime):
+        raise CrawlError(f"Invalid time {value!r}, expected an ISO timestamp or a datetime expression")
+    return time
 
-        return {
-            **super().serialize(),
-            "answers": answers,
-            "shuffle": self.shuffle,
-            "type": "multiple_choice",
-            "selection_limit": self.selection_limit,
-        }
+
+def _eval_spec_expression(value: str) -> Any:
+    """
+    Evaluates the small subset of Python specs use for sizes and times: number and string literals, + - * / // **
+    and calls to datetime.datetime(...), datetime.datetime.now(), datetime.datetime.fromisoformat(...) and
+    datetime.timedelta(...). Anything else is rejected instead of executed.
+    """
+    try:
+        tree = ast.parse(value.strip(), mode="eval")
+    except SyntaxError as e:
+        raise CrawlError(f"Invalid expression {value!r}") from e
+    try:
+        return _eval_spec_node(tree.body, value)
+    except (TypeError, ValueError, OverflowError, ZeroDivisionError) as e:
+        raise CrawlError(f"Invalid expression {value!r}: {e}") from e
+
+
+def _eval_spec_node(node: ast.expr, value: str) -> Any:
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float, str):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+        operand = _eval_spec_node(node.operand, value)
+        return operand if isinstance(node.op, ast.UAdd) else -operand
+    if isinstance(node, ast.BinOp) and type(node.op) in _SPEC_EXPRESSION_OPERATORS:
+        left = _eval_spec_node(node.left, value)
+        right = _eval_spec_node(node.right, value)
+        if isinstance(node.op, ast.Pow) and isinstance(right, (int, float)) and abs(right) > 64:
+            raise CrawlError(f"Exponent too large in expression {value!r}")
+        return _SPEC_EXPRESSION_OPERATORS[type(node.op)](left, right)
+    if isinstance(node, ast.Call) and (function := _SPEC_EXPRESSION_CALLS.get(_dotted_name(node.func))):
+        if any(keyword.arg is None for keyword in node.keywords):
+            raise CrawlError(f"Unsupported keyword unpacking in expression {value!r}")
+        args = [_eval_spec_node(arg, value) for arg in node.args]
+        kwargs = {keyword.arg: _eval_spec_node(keyword.value, value) for keyword in node.keywords}
+        return function(*args, **kwargs)
+
+    raise CrawlError(f"Unsupported expression {ast.unparse(node)!r} in {value!r}")
+
+
+def _dotted_name(node: ast.expr) -> str:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return f"{_dotted_name(node.value)}.{node.attr}"
+    return ""
 
 
 @dataclass
@@ -412,8 +539,8 @@ class IliasTest:
             "title": self.title,
             "description": self.description,
             "intro_text": self.intro_text,
-            "starting_time": self.starting_time,
-            "ending_time": self.ending_time,
+            "starting_time": self.starting_time.isoformat() if self.starting_time else None,
+            "ending_time": self.ending_time.isoformat() if self.ending_time else None,
             "number_of_tries": self.number_of_tries,
             "questions": [questions_title_to_id[question.title] for question in self.questions],
         }
@@ -426,8 +553,8 @@ class IliasTest:
             title=yml["title"],
             description=yml["description"],
             intro_text=yml["intro_text"],
-            starting_time=eval(start_time) if isinstance(start_time, str) else start_time,
-            ending_time=eval(end_time) if isinstance(end_time, str) else end_time,
+            starting_time=_parse_spec_time(start_time) if isinstance(start_time, str) else start_time,
+            ending_time=_parse_spec_time(end_time) if isinstance(end_time, str) else end_time,
             number_of_tries=yml["number_of_tries"],
             questions=test_questions,
         )
@@ -439,8 +566,8 @@ class Spec:
 
 
 def load_spec_from_file(path: Path) -> Spec:
-    with open(path, "r") as file:
-        data = yaml.safe_load(file)
+    # a single bytes buffer lets libyaml decode and parse it without calling back into a file object
+    data = yaml.load(path.read_bytes(), Loader=_YamlSafeLoader)
     questions: dict[str, TestQuestion] = {}
 
     for key, question in data["questions"].items():
@@ -454,36 +581,65 @@ def load_spec_from_file(path: Path) -> Spec:
     return Spec(tests=tests)
 
 
-def dump_questions_to_yml_dict(questions: list[TestQuestion]) -> dict[str, Any]:
+# titles repeat across tests and dumps, and slugify is comparatively expensive
+_slugify_title = functools.lru_cache(maxsize=4096)(slugify)
+
+
+def dump_questions_to_yml_dict(
+    questions: list[TestQuestion], title_to_slug: Optional[dict[str, str]] = None
+) -> dict[str, Any]:
     outer = {}
     for question in questions:
-        slug = slugify(question.title)
+        slug = title_to_slug[question.title] if title_to_slug is not None else _slugify_title(question.title)
         yml_dict = question.serialize()
         outer[slug] = yml_dict
     return outer
 
 
-def dump_tests_to_yml(tests: list[IliasTest]) -> str:
-    questions = [question for test in tests for question in test.questions]
-
+def dump_tests_to_yml(tests: list[IliasTest], stream: Optional[TextIO] = None) -> Optional[str]:
+    """
+    Dumps the tests and their questions as a spec. Writes to the stream if one is given, returns the YAML otherwise.
+    """
+    # tests may share question objects, only serialize each once
+    questions: dict[int, TestQuestion] = {}
     question_title_to_id = {}
-    for question in questions:
-        question_title_to_id[question.title] = slugify(question.title)
+    for test in tests:
+        for question in test.questions:
+            if id(question) in questions:
+                continue
+            questions[id(question)] = question
+            if question.title not in question_title_to_id:
+                question_title_to_id[question.title] = _slugify_title(question.title)
 
     tests_dict = {}
     for test in tests:
-        slug = slugify(test.title)
+        slug = _slugify_title(test.title)
         yml_dict = test.serialize(question_title_to_id)
         tests_dict[slug] = yml_dict
 
-    return yaml.safe_dump(
-        {"tests": tests_dict, "questions": dump_questions_to_yml_dict(questions)}, indent=2, allow_unicode=True
+    return yaml.dump(
+        {"tests": tests_dict, "questions": dump_questions_to_yml_dict(list(questions.values()), question_title_to_id)},
+        stream,
+        Dumper=_YamlSafeDumper,
+        indent=2,
+        allow_unicode=True,
     )
 
 
 def filter_with_regex(element: str, regex: str) -> bool:
-    result = re.fullmatch(regex, element) is not None
-    log.explain(f"Keep {element!r} for regex {regex!r}? {'Yes' if result else 'No'}")
+    return filter_with_regex_compiled(element, _compile_filter_regex(regex))
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_filter_regex(regex: str) -> re.Pattern[str]:
+    return re.compile(regex)
+
+
+def filter_with_regex_compiled(element: str, pattern: re.Pattern[str]) -> bool:
+    result = pattern.fullmatch(element) is not None
+    # called for every crawled element, so only format the message if it is printed
+    if log.output_explain:
+        log.explain(f"Keep {element!r} for regex {pattern.pattern!r}? {'Yes' if result else 'No'}")
     return result
 
 
@@ -559,58 +715,67 @@ class ManualGradingParticipantResults:
     participant: ManualGradingParticipantInfo
     answers: list[ManualGradingGradedQuestion]
 
+    def __post_init__(self):
+        # not a dataclass field, so asdict and the generated __eq__/__repr__ ignore it
+        self._answers_by_id: dict[str, ManualGradingGradedQuestion] = {}
+        for answer in self.answers:
+            self._answers_by_id.setdefault(answer.question.id, answer)
+
+    def add_answer(self, answer: ManualGradingGradedQuestion):
+        self.answers.append(answer)
+        self._answers_by_id.setdefault(answer.question.id, answer)
+
     def get_question(self, question_id: str) -> Optional[ManualGradingGradedQuestion]:
-        for question in self.answers:
-            if question.question.id == question_id:
-                return question
-        return None
+        return self._answers_by_id.get(question_id)
 
 
 def manual_grading_write_question_md(
     results: list[ManualGradingParticipantResults], question: ManualGradingQuestion, convert_to_markdown: bool = True
 ) -> str:
-    md = f"# {question.text}\n\n"
+    parts = [f"# {question.text}\n\n"]
 
     def convert(text: str) -> str:
         if not convert_to_markdown:
             return text
+        # Most feedback is still empty, skip the pipeline for it
+        if not text or text.isspace():
+            return ""
         # Remove spaces between <p> tags
-        text = re.sub(r"\s+<p>", "<p>", text)
+        text = _SPACE_BEFORE_PARAGRAPH_RE.sub("<p>", text)
         # Remove (basically) empty paragraphs
-        text = re.sub(r"<p[^>]+>(\s|&nbsp;)+</p>\n*", "", text)
-        text = re.sub(r"\s+<pre>", "<pre>", text)
-        text = re.sub(r"</p>(\s|\n)+", "</p>", text)
-        text = markdownify(text, escape_misc=False, escape_underscore=False, escape_asterisks=False)
-        text = re.sub(r"\n+```", "\n```", text)
-        text = text.replace(r"\_", "_")
+        text = _EMPTY_PARAGRAPH_RE.sub("", text)
+        text = _SPACE_BEFORE_PRE_RE.sub("<pre>", text)
+        text = _SPACE_AFTER_PARAGRAPH_RE.sub("</p>", text)
+        text = _MARKDOWN_CONVERTER.convert(text)
+        text = _MARKDOWN_FIXUP_RE.sub(lambda match: "_" if match.group(0) == r"\_" else "\n```", text)
         return text.strip()
 
+    is_upload = question.question_type == "file_upload"
     for result in results:
         participant = result.participant
         if question_result := result.get_question(question.id):
-            is_upload = question.question_type == "file_upload"
-            md += f"## {participant.format_name()}\n\n"
-            md += f"### Answer {question_result.points} / {question.max_points}\n"
-            md += "```\n"
+            parts.append(f"## {participant.format_name()}\n\n")
+            parts.append(f"### Answer {question_result.points} / {question.max_points}\n```\n")
             if not is_upload:
                 assert type(question_result.answer) is str
-                md += convert(question_result.answer)
+                parts.append(convert(question_result.answer))
             else:
-                md += "file_upload"
-            md += "\n```\n"
-            md += "----\n"
+                parts.append("file_upload")
+            parts.append("\n```\n----\n")
             if question_result.feedback is None:
                 question_result.feedback = ""
             if is_upload:
                 # Already formatted
-                md += f"{question_result.feedback.strip()}\n\n"
+                parts.append(f"{question_result.feedback.strip()}\n\n")
             else:
-                md += f"{convert(question_result.feedback).strip()}\n\n"
+                parts.append(f"{convert(question_result.feedback).strip()}\n\n")
 
-    return md
+    return "".join(parts)
 
 
 class StringReader:
+    __slots__ = ("position", "underlying")
+
     underlying: str
     position: int
 
@@ -626,6 +791,15 @@ class StringReader:
         self.position = pos + len(pattern)
         return result
 
+    def read_until_or_rest(self, pattern: str) -> str:
+        """Like read_until, but reads the rest of the string if the pattern does not occur."""
+        pos = self.underlying.find(pattern, self.position)
+        if pos < 0:
+            return self.read_rest()
+        result = self.underlying[self.position : pos]
+        self.position = pos + len(pattern)
+        return result
+
     def read_line(self) -> str:
         return self.read_until("\n")
 
@@ -647,17 +821,20 @@ class StringReader:
 
 def load_manual_grading_results_from_md(folder: Path) -> dict[str, ManualGradingParticipantResults]:
     participant_results = dict()
-    for question_md in folder.glob("*.md"):
-        question_id = str(question_md.name).replace(".md", "")
-        with open(question_md, "r") as f:
-            content = f.read()
+    with os.scandir(folder) as entries:
+        question_files = [entry for entry in entries if entry.name.endswith(".md") and entry.is_file()]
+    for question_md in question_files:
+        question_id = question_md.name.replace(".md", "")
+        # written as UTF-8 by slurp_grading_state_to_md, independent of the platform's default encoding
+        with open(question_md.path, "rb") as f:
+            content = f.read().decode("utf-8")
         question_results = _parse_manual_grading_question_file(question_id, content)
         students = _parse_students_from_md(content)
 
         for email, result in question_results.items():
             if email not in participant_results:
                 participant_results[email] = ManualGradingParticipantResults(students[email], [])
-            participant_results[email].answers.append(result)
+            participant_results[email].add_answer(result)
 
     answer_counts = [len(participant.answers) for participant in participant_results.values()]
     if len(set(answer_counts)) != 1:
@@ -668,13 +845,11 @@ def load_manual_grading_results_from_md(folder: Path) -> dict[str, ManualGrading
 
 def _parse_students_from_md(text: str):
     results = dict()
-    students = [line for line in text.splitlines() if line.startswith("## ")]
 
-    for student in students:
-        student = student.replace("## ", "")
-        email = student[: student.find("(")].strip()
+    for match in _STUDENT_HEADING_RE.finditer(text):
+        email = match.group("email").strip()
         username = email.split("@")[0]
-        last_name, first_name = student[student.find("(") + 1 : student.find(")")].split(", ")
+        last_name, first_name = match.group("name").split(", ")
         results[email] = ManualGradingParticipantInfo(last_name, first_name, email, username, "")
 
     return results
@@ -709,10 +884,7 @@ def _parse_student_question_result(
     answer = reader.read_until("\n```\n")
 
     reader.read_until("----\n")
-    if reader.can_find("## "):
-        feedback = reader.read_until("## ").strip()
-    else:
-        feedback = reader.read_rest().strip()
+    feedback = reader.read_until_or_rest("## ").strip()
 
     graded_question = ManualGradingGradedQuestion(
         ManualGradingQuestion(
@@ -738,11 +910,7 @@ def _parse_student_question_result(
 
 def manual_grading_feedback_md_to_html(markdown: str) -> str:
     html = markdown2.markdown(markdown, extras=["fenced-code-blocks", "tables", "strike", "code-friendly"])
-    bs4 = soupify(html.encode())
-
-    # Fix blockquotes for TinyMCE
-    for quote in bs4.find_all("blockquote"):
-        quote.name = "div"
-        quote["style"] = "border-left: 4px solid #d1d9e0; color: #59636e; padding-left: 1em;"
 
-    return bs4.decode_contents()
+    # Fix blockquotes for TinyMCE. markdown2 escapes "<" in code, so every match is a real tag
+    html = _BLOCKQUOTE_OPEN_RE.sub(_STYLED_BLOCKQUOTE_DIV, html)
+    return html.replace("</blockquote>", "</div>")